@@ -1,13 +1,130 @@
 from collections import Counter
-from functools import cached_property
-from typing import Optional, Union
-from typing import Tuple, Union, List, Dict, Any
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from functools import cached_property, partial
+from typing import Optional, Tuple, Union, List, Dict, Any, Iterator
 import json
+import os
 from tqdm.auto import tqdm
 import pathlib
 import numpy as np
 import cv2
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to numpy.
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser.
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; only JSERStreamIngester needs it.
+    ijson = None
+
+
+def _read_jser(path: Union[str, pathlib.Path]) -> Dict[str, Any]:
+    """
+    Parse a JSER file, using orjson on the raw bytes when it is installed.
+
+    """
+    path = pathlib.Path(path)
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text())
+
+
+def _count_slice_names(cnames: Counter, seg_dict: Dict[str, Any]):
+    """
+    Add the number of contours for each name on one raw slice to cnames.
+
+    """
+    for name, contours in seg_dict["contours"].items():
+        if len(contours) > 0:
+            cnames[name] += len(contours)
+
+
+def _tform_matrix(
+    tforms: Union[np.ndarray, Tuple[float, float, float, float, float, float]],
+    mag: float = 1.0,
+) -> np.ndarray:
+    """
+    Return the (3, 2) matrix that applies a Reconstruct tform to (x, y, 1) rows
+    and then scales the result by mag.
+
+    tforms is the row-major 2x3 affine [[a, b, c], [d, e, f]] in the same units
+    as the points, so the translation is applied before converting to pixels.
+    A matrix that has already been built by this function is also accepted.
+
+    """
+    tforms = np.asarray(tforms, dtype=np.float32)
+    if tforms.shape != (3, 2):
+        tforms = tforms.reshape(2, 3).T
+    return tforms * np.float32(mag)
+
+
+def _transform_points_numpy(points: np.ndarray, tform: np.ndarray, out: np.ndarray):
+    """
+    Transform points into out, truncating if out is an integer buffer.
+
+    Performs the same float32 operations, in the same order, as the numba
+    kernel, so both produce identical pixels.
+
+    """
+    x = points[:, 0]
+    y = points[:, 1]
+    out[:, 0] = x * tform[0, 0] + y * tform[1, 0] + tform[2, 0]
+    out[:, 1] = x * tform[0, 1] + y * tform[1, 1] + tform[2, 1]
+
+
+def _transform_points_kernel(points: np.ndarray, tform: np.ndarray, out: np.ndarray):
+    """
+    Transform points into out, truncating if out is an integer buffer.
+
+    """
+    for k in range(points.shape[0]):
+        x = points[k, 0]
+        y = points[k, 1]
+        out[k, 0] = x * tform[0, 0] + y * tform[1, 0] + tform[2, 0]
+        out[k, 1] = x * tform[0, 1] + y * tform[1, 1] + tform[2, 1]
+
+
+if njit is not None:
+    # Not parallel=True: slices are already spread across worker processes,
+    # and numba's thread pool is not safe to fork once it has started.
+    _transform_points_kernel = njit(cache=True)(_transform_points_kernel)
+else:
+    _transform_points_kernel = _transform_points_numpy
+
+
+def _transform_points(
+    points: np.ndarray,
+    mag: float,
+    tforms: Union[np.ndarray, Tuple[float, float, float, float, float, float]],
+    dtype: type = np.float32,
+) -> np.ndarray:
+    """
+    Return (K, 2) points transformed and then scaled by mag.
+
+    This is the one place points are scaled and transformed. All arithmetic is
+    float32; with an integer dtype the result is truncated, ready for OpenCV.
+    Uses a compiled kernel when numba is installed.
+
+    """
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    tform = np.ascontiguousarray(_tform_matrix(tforms, mag))
+    out = np.empty((len(points), 2), dtype=dtype)
+    _transform_points_kernel(points, tform, out)
+    return out
+
 
 class Contour:
     """
@@ -15,6 +132,21 @@ class Contour:
     ['color', 'closed', 'negative', 'x', 'y', 'hidden', 'mode', 'tags', 'history', 'name']
     """
 
+    __slots__ = (
+        "points",
+        "x",
+        "y",
+        "color",
+        "name",
+        "hidden",
+        "closed",
+        "negative",
+        "tags",
+        "history",
+        "mode",
+        "offset_xy",
+    )
+
     def __init__(
         self,
         points: Optional[Union[np.ndarray, List[Tuple[float, float]]]] = None,
@@ -35,9 +167,11 @@ class Contour:
 
         """
         if points is not None:
-            self.points = np.array(points)
+            self.points = np.asarray(points, dtype=np.float32)
         elif x is not None and y is not None:
-            self.points = np.array(list(zip(x, y)))
+            self.points = np.column_stack(
+                (np.asarray(x, dtype=np.float32), np.asarray(y, dtype=np.float32))
+            )
         else:
             raise ValueError("Must provide either points or x and y.")
         self.x = self.points[:, 0]
@@ -117,26 +251,114 @@ class Contour:
         """
         return Contour.from_dict({**self.to_dict(), **kwargs})
 
+    def _with_points(self, points: np.ndarray) -> "Contour":
+        """
+        Return a shallow copy of the contour with new points.
+
+        This skips the to_dict/from_dict round trip used by `with_updated`.
+
+        """
+        c = object.__new__(Contour)
+        for attr in Contour.__slots__:
+            setattr(c, attr, getattr(self, attr))
+        c.points = points
+        c.x = points[:, 0]
+        c.y = points[:, 1]
+        return c
+
     def with_mag(self, mag: float) -> "Contour":
         """
         Return a new contour with the points scaled by a given magnitude.
 
         """
-        return self.copy().with_updated(x=self.x * mag, y=self.y * mag)
+        return self._with_points(self.points * mag)
 
     def with_tforms(
-        self, tforms: Tuple[float, float, float, float, float, float]
+        self,
+        tforms: Union[np.ndarray, Tuple[float, float, float, float, float, float]],
     ) -> "Contour":
         """
         Return a new contour with the points transformed.
 
-        tforms is a 6-tuple of floats. This can be reshaped into the affine
-        transformation matrix and applied to the points.
+        tforms is a 6-tuple of floats. This can be reshaped into the 2x3
+        affine transformation matrix and applied to the points. A matrix
+        prebuilt with `_tform_matrix` is also accepted, so callers that
+        transform many contours need only build it once.
 
         """
-        # return Contour(points=np.matmul(self.points, np.array(tforms).reshape(2,3).T))
-        return self.copy().with_updated(
-            points=np.matmul(self.points, np.array(tforms).reshape(3, 2).T)
+        return self._with_points(_transform_points(self.points, 1.0, tforms))
+
+
+@dataclass
+class SliceContours:
+    """
+    All of the contours on one slice, stored as columnar arrays.
+
+    Contour i has points `points[offsets[i]:offsets[i + 1]]`, and its name is
+    `names[name_ids[i]]`. Indexing returns a `Contour` view for callers that
+    want one object per polygon.
+
+    """
+
+    points: np.ndarray  # (K, 2) float32
+    offsets: np.ndarray  # (N + 1,) int32
+    colors: np.ndarray  # (N, 3) uint8
+    name_ids: np.ndarray  # (N,) int32
+    closed: np.ndarray  # (N,) bool
+    names: List[str]
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "SliceContours":
+        """
+        Create the columnar contours from one raw JSER slice dictionary.
+
+        """
+        xs, ys, lengths, colors, name_ids, closed = [], [], [], [], [], []
+        names: Dict[str, int] = {}
+        for name, contours in d["contours"].items():
+            if len(contours) == 0:
+                # Names without traces are not counted by count_names either.
+                continue
+            name_id = names.setdefault(name, len(names))
+            for contour in contours:
+                xs.extend(contour["x"])
+                ys.extend(contour["y"])
+                lengths.append(len(contour["x"]))
+                colors.append(contour["color"])
+                name_ids.append(name_id)
+                closed.append(bool(contour["closed"]))
+
+        points = np.empty((len(xs), 2), dtype=np.float32)
+        points[:, 0] = xs
+        points[:, 1] = ys
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum(lengths)
+        return cls(
+            points=points,
+            offsets=offsets,
+            colors=np.array(colors, dtype=np.uint8).reshape(-1, 3),
+            name_ids=np.array(name_ids, dtype=np.int32),
+            closed=np.array(closed, dtype=bool),
+            names=list(names),
+        )
+
+    def __len__(self) -> int:
+        """
+        Return the number of contours on the slice.
+
+        """
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Contour:
+        """
+        Return contour i as a Contour that shares this slice's points buffer.
+
+        """
+        return Contour(
+            points=self.points[self.offsets[i] : self.offsets[i + 1]],
+            color=tuple(int(c) for c in self.colors[i]),
+            closed=bool(self.closed[i]),
+            name=self.names[self.name_ids[i]],
         )
 
 
@@ -149,7 +371,7 @@ class JSERIngester:
 
         """
         if isinstance(jser, (str, pathlib.Path)):
-            jser = json.loads(pathlib.Path(jser).read_text())
+            jser = _read_jser(jser)
         self.jser = jser
 
     @cached_property
@@ -193,37 +415,45 @@ class JSERIngester:
             key = int(key.split(".")[-1])
         return key
 
-    def keys(self) -> List[int]:
+    @cached_property
+    def _int_keys(self) -> Tuple[int, ...]:
         """
-        Return the keys of the raw JSER dictionary.
+        Return the sorted integer slice keys, parsed once.
 
         """
-        return list(
-            [int(k.split(".")[-1]) for k in self.raw.keys() if not k.endswith(".ser")]
+        return tuple(
+            sorted(
+                int(k.split(".")[-1]) for k in self.raw.keys() if not k.endswith(".ser")
+            )
         )
 
+    def keys(self) -> List[int]:
+        """
+        Return the keys of the raw JSER dictionary, in ascending order.
+
+        """
+        return list(self._int_keys)
+
     def get_unique_colors_for_slice(self, slice_num: int) -> List[str]:
         """
         Return the colors for the given slice.
 
         """
-        colors = []
+        colors = {}
         for c in self.get_raw_contours_for_slice(slice_num):
-            if c.color not in colors:
-                colors.append(c.color)
-        return colors
+            colors.setdefault(tuple(c.color), c.color)
+        return list(colors.values())
 
     def get_all_unique_colors(self) -> List[str]:
         """
         Return the colors for the given slice.
 
         """
-        colors = []
+        colors = {}
         for z in self.keys():
             for c in self.get_raw_contours_for_slice(z):
-                if c.color not in colors:
-                    colors.append(c.color)
-        return colors
+                colors.setdefault(tuple(c.color), c.color)
+        return list(colors.values())
 
     def get_raw_contours_for_slice(self, slice_num: int) -> List[Contour]:
         """
@@ -238,6 +468,14 @@ class JSERIngester:
                 flattened_contours.append(contour)
         return [Contour.from_dict(d) for d in flattened_contours]
 
+    def get_raw_slice_contours(self, slice_num: int) -> SliceContours:
+        """
+        Return the contours for the given slice as columnar arrays, without
+        performing affines.
+
+        """
+        return SliceContours.from_dict(self[slice_num])
+
     def contours(
         self,
         key: Union[int, str],
@@ -253,55 +491,226 @@ class JSERIngester:
             if filter_by_colors is not None
             else None
         )
-        return [
-            d.with_mag(1.0 / self[key]["mag"]).with_tforms(
-                self[key]["tforms"]["default"]
-            )
+        contours = [
+            d
             for d in self.get_raw_contours_for_slice(key)
             if filter_by_colors is None or d.color in filter_by_colors
         ]
+        if len(contours) == 0:
+            return contours
+
+        # Transform and scale every point on the slice in one call rather
+        # than once per contour.
+        seg_dict = self[key]
+        lengths = [len(c) for c in contours]
+        transformed = _transform_points(
+            np.concatenate([c.points for c in contours]),
+            1.0 / seg_dict["mag"],
+            seg_dict["tforms"]["default"],
+        )
+        for contour, pts in zip(
+            contours, np.split(transformed, np.cumsum(lengths)[:-1])
+        ):
+            contour.points = pts
+            contour.x = pts[:, 0]
+            contour.y = pts[:, 1]
+        return contours
 
     def count_names(self) -> Dict[str, int]:
         """
         Return the number of contours for each name.
 
         """
-        all_names = []
-
+        cnames = Counter()
         for z in self.keys():
-            names = [c.name for c in self.contours(z)]
-            all_names.extend(names)
-        cnames = Counter(all_names)
+            _count_slice_names(cnames, self[z])
+        return cnames
+
+
+class JSERStreamIngester:
+    def __init__(self, jser: Union[str, pathlib.Path]):
+        """
+        Create a new streaming JSER file ingest.
+
+        The file is parsed incrementally with ijson, so only one slice is held
+        in memory at a time. Use this instead of JSERIngester for files that
+        are too large to load whole.
+
+        """
+        if ijson is None:
+            raise ImportError("JSERStreamIngester requires the ijson package.")
+        self.path = pathlib.Path(jser)
+
+    def __iter__(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield (key, slice dictionary) pairs in file order.
+
+        """
+        with self.path.open("rb") as f:
+            for key, value in ijson.kvitems(f, "", use_float=True):
+                if key.endswith(".ser"):
+                    continue
+                yield int(key.split(".")[-1]), value
+
+    def count_names(self) -> Dict[str, int]:
+        """
+        Return the number of contours for each name.
+
+        This reads through the whole file once.
+
+        """
+        cnames = Counter()
+        for _, slice_dict in self:
+            _count_slice_names(cnames, slice_dict)
         return cnames
 
 
+def _fill_polys(img: np.ndarray, polys: List[np.ndarray], labels: List[int]):
+    """
+    Fill each polygon with its label, in order.
+
+    Each polygon gets its own fillPoly call: a single call over several
+    polygons uses the even-odd rule, so overlapping traces would cancel out.
+
+    """
+    for poly, label in zip(polys, labels):
+        cv2.fillPoly(img, [poly], label)
+
+
+def _iter_color_masks(
+    seg_dict: Dict[str, Any],
+    image_size_xy: Tuple[int, int],
+    name_to_idx: Dict[str, int],
+) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    Yield (color, image) for each contour color in a raw slice dictionary.
+
+    The same image buffer is cleared and redrawn for every color, so each
+    image must be consumed (or copied) before the next one is requested.
+
+    """
+    contours = SliceContours.from_dict(seg_dict)
+    pixels = _transform_points(
+        contours.points,
+        1.0 / seg_dict["mag"],
+        seg_dict["tforms"]["default"],
+        dtype=np.int32,
+    )
+    labels = np.array([name_to_idx[n] for n in contours.names], dtype=np.int64)
+    not_loc = np.array(["loc" not in n.lower() for n in contours.names], dtype=bool)
+    drawable = np.flatnonzero(not_loc[contours.name_ids])
+    by_color: Dict[Tuple[int, int, int], List[int]] = {}
+    for i, col in zip(drawable, contours.colors[drawable].tolist()):
+        by_color.setdefault(tuple(col), []).append(i)
+    if len(by_color) == 0:
+        return
+    img = np.zeros(image_size_xy, dtype=np.uint8)
+    for col, idx in by_color.items():
+        # use cv2 to draw contours
+        img.fill(0)
+        polys, poly_labels = [], []
+        for i in idx:
+            points = pixels[contours.offsets[i] : contours.offsets[i + 1]]
+            if len(points) < 3:
+                continue
+            polys.append(points)
+            # the label is the index of the name in the sorted name list
+            poly_labels.append(int(labels[contours.name_ids[i]]))
+        _fill_polys(img, polys, poly_labels)
+        yield "_".join(map(str, col)), img
+
+
 def plot_contours(
-    z: int, seg: JSERIngester, image_size_xy: Tuple[int, int], sorted_name_list
+    z: int,
+    seg: JSERIngester,
+    image_size_xy: Tuple[int, int],
+    name_to_idx: Dict[str, int],
 ) -> Dict[str, np.ndarray]:
     """
     Plot the contours on a 2D image.
 
+    Each contour is filled with the value name_to_idx[name].
+
     """
-    unique_colors = seg.get_unique_colors_for_slice(z)
-    imgs = {}
-    for col in unique_colors:
-        cs = seg.contours(z, filter_by_colors=[col])
-        cs = [c for c in cs if "loc" not in c.name.lower()]
-        if len(cs) == 0:
-            continue
-        # use cv2 to draw contours
-        img = np.zeros(image_size_xy, dtype=np.uint8)
-        for con in cs:
-            # color is the index of the name in the sorted_name_list
-            color = sorted_name_list.index(con.name)
-            if len(con.x) < 3:
-                continue
-            contours = np.array([np.array([con.x, con.y]).T]).astype(np.int32)
-            img = cv2.drawContours(
-                np.ascontiguousarray(img), contours, -1, int(color), cv2.FILLED
-            )
-        imgs["_".join(map(str, col))] = img
-    return imgs
+    return {
+        col: img.copy()
+        for col, img in _iter_color_masks(seg[z], image_size_xy, name_to_idx)
+    }
+
+
+# Per-process state for pool workers, set once by _init_worker.
+_worker_seg: Optional[JSERIngester] = None
+_worker_io_pool: Optional[ThreadPoolExecutor] = None
+_worker_made_dirs: set = set()
+
+
+def _init_worker(jser: Optional[Dict[str, Any]]):
+    """
+    Build the worker process's ingester from the already-parsed JSER dict.
+
+    jser is None when streaming, in which case each task carries its slice.
+
+    """
+    global _worker_seg, _worker_io_pool, _worker_made_dirs
+    _worker_seg = JSERIngester(jser) if jser is not None else None
+    _worker_io_pool = ThreadPoolExecutor(max_workers=4)
+    _worker_made_dirs = set()
+
+
+def _render_slice(
+    z: int,
+    seg_dict: Dict[str, Any],
+    image_size_xy: Tuple[int, int],
+    name_to_idx: Dict[str, int],
+    output_path: Union[str, pathlib.Path],
+    io_pool: ThreadPoolExecutor,
+    made_dirs: set,
+):
+    """
+    Render one slice and write one PNG per color.
+
+    PNG encoding runs on io_pool while the next color is drawn; the slice is
+    finished once all of its writes are. made_dirs remembers the output
+    directories that already exist.
+
+    """
+    writes = []
+    for col, img in _iter_color_masks(seg_dict, image_size_xy, name_to_idx):
+        # Make the directory if it doesn't exist
+        col_dir = f"{output_path}/{col}"
+        if col_dir not in made_dirs:
+            pathlib.Path(col_dir).mkdir(parents=True, exist_ok=True)
+            made_dirs.add(col_dir)
+        # Copy, since the buffer is redrawn for the next color.
+        writes.append(io_pool.submit(cv2.imwrite, f"{col_dir}/{z}.png", img.copy()))
+    for w in writes:
+        w.result()
+
+
+def _process_slice(
+    z: int,
+    seg_dict: Optional[Dict[str, Any]],
+    image_size_xy: Tuple[int, int],
+    name_to_idx: Dict[str, int],
+    output_path: Union[str, pathlib.Path],
+):
+    """
+    Render one slice in a pool worker.
+
+    If seg_dict is None, the slice is read from the worker's ingester.
+
+    """
+    if seg_dict is None:
+        seg_dict = _worker_seg[z]
+    _render_slice(
+        z,
+        seg_dict,
+        image_size_xy,
+        name_to_idx,
+        output_path,
+        _worker_io_pool,
+        _worker_made_dirs,
+    )
 
 
 def jser_to_image_stack(
@@ -310,18 +719,81 @@ def jser_to_image_stack(
     image_size_xy: Tuple[int, int],
     progress: bool = True,
     zs: Optional[List[int]] = None,
+    max_workers: Optional[int] = 1,
+    stream: bool = False,
 ):
-    seg = JSERIngester(jser)
+    """
+    Render each slice of a JSER file to per-color PNG masks.
+
+    By default slices are rendered one after another in this process. With
+    max_workers > 1 (or None, for one per CPU) they are rendered in parallel
+    by a process pool; under the spawn start method (macOS, Windows) the
+    calling script then needs an `if __name__ == "__main__":` guard.
+
+    With stream=True the file is read twice with JSERStreamIngester (once to
+    collect names, once to render) and only a bounded number of slices is
+    held in memory at a time.
+
+    """
+    zs = set(zs) if zs is not None else None
+    if stream:
+        if isinstance(jser, dict):
+            raise ValueError("stream=True requires a path to a JSER file.")
+        seg = JSERStreamIngester(jser)
+        slices = ((z, d) for z, d in seg if zs is None or z in zs)
+        total = None
+        initargs = (None,)
+    else:
+        seg = JSERIngester(jser)
+        keys = [z for z in seg.keys() if zs is None or z in zs]
+        slices = ((z, None) for z in keys)
+        total = len(keys)
+        initargs = (seg.jser,)
+
     name_counts = seg.count_names()
     sorted_names = sorted(name_counts.items(), key=lambda x: x[0], reverse=True)
-    sorted_name_list = [n[0] for n in sorted_names]
-
-    _prog = tqdm if progress else lambda x: x
-    for z in _prog(seg.keys()):
-        if zs is not None and z not in zs:
-            continue
-        imgs = plot_contours(z, seg, image_size_xy, sorted_name_list)
-        for col, img in imgs.items():
-            # Make the directory if it doesn't exist
-            pathlib.Path(f"{output_path}/{col}").mkdir(parents=True, exist_ok=True)
-            cv2.imwrite(f"{output_path}/{col}/{z}.png", img)
+    name_to_idx = {n[0]: i for i, n in enumerate(sorted_names)}
+
+    if max_workers == 1:
+        made_dirs: set = set()
+        with ThreadPoolExecutor(max_workers=4) as io_pool, tqdm(
+            total=total, disable=not progress
+        ) as bar:
+            for z, seg_dict in slices:
+                if seg_dict is None:
+                    seg_dict = seg[z]
+                _render_slice(
+                    z,
+                    seg_dict,
+                    image_size_xy,
+                    name_to_idx,
+                    output_path,
+                    io_pool,
+                    made_dirs,
+                )
+                bar.update()
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    render = partial(
+        _process_slice,
+        image_size_xy=image_size_xy,
+        name_to_idx=name_to_idx,
+        output_path=output_path,
+    )
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=initargs
+    ) as ex, tqdm(total=total, disable=not progress) as bar:
+        # Keep a bounded number of slices in flight, so a streamed file is
+        # never read much further ahead than the workers can render.
+        pending = set()
+        for z, seg_dict in slices:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    f.result()
+                bar.update(len(done))
+            pending.add(ex.submit(render, z, seg_dict))
+        for f in wait(pending).done:
+            f.result()
+        bar.update(len(pending))
@@ -0,0 +1,172 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from reconstruct2stack import (
+    Contour,
+    JSERIngester,
+    JSERStreamIngester,
+    _tform_matrix,
+    _transform_points_kernel,
+    _transform_points_numpy,
+    jser_to_image_stack,
+    plot_contours,
+)
+
+
+def _contour(x, y, color=(255, 0, 0)):
+    return {
+        "x": list(x),
+        "y": list(y),
+        "color": list(color),
+        "closed": True,
+        "negative": False,
+        "hidden": False,
+        "mode": 11,
+        "tags": [],
+        "history": [],
+    }
+
+
+def _jser(contours, mag=0.005, tforms=(1, 0, 0, 0, 1, 0)):
+    return {
+        "series.ser": {},
+        "series.0": {
+            "mag": mag,
+            "tforms": {"default": list(tforms)},
+            "contours": contours,
+        },
+    }
+
+
+def _square(x0, y0, size):
+    return [x0, x0 + size, x0 + size, x0], [y0, y0, y0 + size, y0 + size]
+
+
+def test_contours_scale_by_mag():
+    jser = _jser({"obj": [_contour(*_square(0.1, 0.2, 0.5))]})
+    (c,) = JSERIngester(jser).contours(0)
+    np.testing.assert_allclose(c.x, [20, 120, 120, 20], atol=1e-3)
+    np.testing.assert_allclose(c.y, [40, 40, 140, 140], atol=1e-3)
+
+
+def test_contours_translate_in_point_units():
+    jser = _jser(
+        {"obj": [_contour(*_square(0.1, 0.2, 0.5))]}, tforms=(1, 0, 0.1, 0, 1, 0)
+    )
+    (c,) = JSERIngester(jser).contours(0)
+    # A 0.1 unit shift is 20 px at mag 0.005.
+    np.testing.assert_allclose(c.x, [40, 140, 140, 40], atol=1e-3)
+    np.testing.assert_allclose(c.y, [40, 40, 140, 140], atol=1e-3)
+
+
+def test_with_tforms_matches_contours():
+    tforms = (0.9, 0.1, 0.2, -0.1, 1.1, 0.3)
+    jser = _jser({"obj": [_contour(*_square(0.1, 0.2, 0.5))]}, tforms=tforms)
+    seg = JSERIngester(jser)
+    (raw,) = seg.get_raw_contours_for_slice(0)
+    (c,) = seg.contours(0)
+    expected = raw.with_tforms(tforms).with_mag(1 / 0.005)
+    np.testing.assert_allclose(c.points, expected.points, atol=1e-3)
+
+
+def test_raw_slice_contours_columns():
+    jser = _jser(
+        {
+            "a": [_contour([0, 1, 1], [0, 0, 1]), _contour([2, 3], [2, 2])],
+            "b": [_contour([5, 6, 6, 5], [5, 5, 6, 6], color=(0, 255, 0))],
+        }
+    )
+    contours = JSERIngester(jser).get_raw_slice_contours(0)
+    assert len(contours) == 3
+    np.testing.assert_array_equal(contours.offsets, [0, 3, 5, 9])
+    assert contours.names == ["a", "b"]
+    c = contours[2]
+    assert isinstance(c, Contour)
+    assert c.name == "b"
+    assert c.color == (0, 255, 0)
+    np.testing.assert_array_equal(c.x, [5, 6, 6, 5])
+    np.testing.assert_array_equal(c.y, [5, 5, 6, 6])
+
+
+def test_numba_kernel_matches_numpy_pixels():
+    pytest.importorskip("numba")
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 40, size=(100_000, 2)).astype(np.float32)
+    tform = _tform_matrix((0.99, 0.02, 0.13, -0.03, 1.01, -0.07), 1 / 0.00254)
+    compiled = np.empty(points.shape, dtype=np.int32)
+    fallback = np.empty(points.shape, dtype=np.int32)
+    _transform_points_kernel(points, tform, compiled)
+    _transform_points_numpy(points, tform, fallback)
+    np.testing.assert_array_equal(compiled, fallback)
+
+
+def test_overlapping_same_name_traces_fill_their_union():
+    jser = _jser(
+        {
+            "obj": [
+                _contour(*_square(10, 10, 40)),
+                _contour(*_square(30, 30, 40)),
+            ]
+        },
+        mag=1.0,
+    )
+    imgs = plot_contours(0, JSERIngester(jser), (100, 100), {"obj": 1})
+    expected = np.zeros((100, 100), dtype=np.uint8)
+    for x0 in (10, 30):
+        square = np.array(_square(x0, x0, 40), dtype=np.int32).T
+        cv2.fillPoly(expected, [square], 1)
+    np.testing.assert_array_equal(imgs["255_0_0"], expected)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_jser_to_image_stack_writes_masks(tmp_path, max_workers, stream):
+    jser = _jser(
+        {
+            "a": [_contour(*_square(10, 10, 20))],
+            "b": [_contour(*_square(40, 40, 20), color=(0, 255, 0))],
+        },
+        mag=1.0,
+    )
+    # More slices than the 2 * max_workers tasks kept in flight.
+    for z in range(1, 6):
+        jser[f"series.{z}"] = jser["series.0"]
+    if stream:
+        pytest.importorskip("ijson")
+        path = tmp_path / "series.jser"
+        path.write_text(json.dumps(jser))
+        jser = path
+    out = tmp_path / "out"
+    jser_to_image_stack(
+        jser, out, (100, 100), progress=False, max_workers=max_workers, stream=stream
+    )
+    for z in range(6):
+        red = cv2.imread(str(out / "255_0_0" / f"{z}.png"), cv2.IMREAD_UNCHANGED)
+        green = cv2.imread(str(out / "0_255_0" / f"{z}.png"), cv2.IMREAD_UNCHANGED)
+        # Names are numbered in reverse sorted order, so "b" is 0 and "a" is 1.
+        assert red[20, 20] == 1 and red[50, 50] == 0
+        assert green[50, 50] == 0 and green.sum() == 0
+
+
+def test_stream_ingester_counts_names_like_jser_ingester(tmp_path):
+    pytest.importorskip("ijson")
+    jser = _jser({"a": [_contour([0, 1, 1], [0, 0, 1])] * 2, "b": [], "c": []})
+    jser["series.1"] = jser["series.0"]
+    path = tmp_path / "series.jser"
+    path.write_text(json.dumps(jser))
+    expected = JSERIngester(jser).count_names()
+    assert expected == {"a": 4}
+    assert JSERStreamIngester(path).count_names() == expected
+
+
+def test_names_without_traces_are_skipped_when_rendering(tmp_path):
+    jser = _jser({"a": [_contour(*_square(10, 10, 20))], "b": []}, mag=1.0)
+    seg = JSERIngester(jser)
+    assert seg.get_raw_slice_contours(0).names == ["a"]
+    imgs = plot_contours(0, seg, (100, 100), {"a": 0})
+    assert list(imgs) == ["255_0_0"]
+    jser_to_image_stack(jser, tmp_path, (100, 100), progress=False)
+    assert (tmp_path / "255_0_0" / "0.png").exists()